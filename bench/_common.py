@@ -0,0 +1,266 @@
+#
+# This file is part of LiteSATA.
+#
+# Copyright (c) 2015-2024 Florent Kermarrec <florent@enjoy-digital.fr>
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+import multiprocessing
+import hashlib
+
+from migen import *
+
+from litex.gen import *
+
+from litex.soc.integration.soc_core import *
+
+from litesata.common               import *
+from litesata.phy                  import LiteSATAPHY
+from litesata.core                 import LiteSATACore
+from litesata.frontend.arbitration import LiteSATACrossbar
+from litesata.frontend.bist        import LiteSATABIST
+
+from litescope import LiteScopeAnalyzer
+
+# Checkpoint Cache ---------------------------------------------------------------------------------
+
+def sata_config_hash(device, gen, data_width, sata_refclk_freq):
+    # Key on the configuration only (not on sources): cached checkpoints are incremental references,
+    # meant to be reused across source changes.
+    # RefClk source: GT RefClk pads (None) or PLL generated (frequency).
+    h = hashlib.sha256()
+    h.update(f"{device}:{gen}:{data_width}:{sata_refclk_freq}".encode())
+    return h.hexdigest()
+
+def checkpoint_cache_dir(builder):
+    # Per-configuration (build/cache/<hash>): only shared by builds with the same device/SATA config.
+    return os.path.abspath(os.path.join(os.path.dirname(builder.output_dir), "cache", builder.soc.config_hash))
+
+# Incremental Synthesis ----------------------------------------------------------------------------
+
+def synth_reference_dcp_path(builder):
+    return os.path.join(checkpoint_cache_dir(builder), f"{builder.soc.platform.name}_synth_ref.dcp")
+
+def add_incremental_synthesis(builder):
+    # LiteX generates a single flattened netlist, so the PHY can't be synthesized out-of-context;
+    # instead, use the post-synthesis checkpoint of the whole design from the previous build as
+    # incremental synthesis reference so that unchanged logic (PHY, ...) is reused by Vivado. The
+    # reference is refreshed after each successful synthesis.
+    toolchain = builder.soc.platform.toolchain
+    cache_dir = checkpoint_cache_dir(builder)
+    synth_ref = synth_reference_dcp_path(builder)
+    if os.path.exists(synth_ref):
+        toolchain.pre_synthesis_commands.append(f"read_checkpoint -incremental {synth_ref}")
+    toolchain.pre_optimize_commands.append(f"file mkdir {cache_dir}")
+    toolchain.pre_optimize_commands.append(f"file copy -force {{build_name}}_synth.dcp {synth_ref}")
+
+# Incremental Implementation -----------------------------------------------------------------------
+
+def add_incremental_implementation(builder, reference_dcp=None):
+    # Reuse placement/routing of a reference routed checkpoint. By default, use LiteX's incremental
+    # implementation support, that reads the routed checkpoint of the last build from the gateware
+    # directory.
+    toolchain = builder.soc.platform.toolchain
+    if reference_dcp is None:
+        reference_dcp = os.path.join(builder.gateware_dir, f"{builder.soc.platform.name}_route.dcp")
+        if os.path.exists(reference_dcp):
+            toolchain.incremental_implementation = True
+            return
+    elif os.path.exists(reference_dcp):
+        toolchain.pre_placement_commands.append(f"read_checkpoint -incremental {os.path.abspath(reference_dcp)}")
+        return
+    print(f"No reference checkpoint found ({reference_dcp}), running full implementation.")
+
+# Build Cache --------------------------------------------------------------------------------------
+
+# Lines of the generated files not impacting the bitstream (timestamps, Vivado threads).
+_build_hash_ignored_lines = (
+    "// Date",                      # Verilog header.
+    "//  Auto-Generated by LiteX",  # Verilog footer.
+    "# Auto-generated by LiteX",    # CSV header.
+    "set_param general.maxThreads", # Tcl, --jobs.
+)
+
+def get_build_hash(builder):
+    # Hash what Vivado consumes, to be called after builder.build(run=False).
+    build_name = builder.soc.platform.name
+    filenames  = {filename for filename, *_ in builder.soc.platform.sources} # Generated Verilog + HDL.
+    filenames.add(os.path.join(builder.gateware_dir, build_name + ".xdc"))
+    filenames.add(os.path.join(builder.gateware_dir, build_name + ".tcl"))
+    for filename in os.listdir(builder.gateware_dir):
+        if filename.endswith(".init"):
+            filenames.add(os.path.join(builder.gateware_dir, filename))
+    if builder.csr_csv is not None:
+        filenames.add(os.path.abspath(builder.csr_csv))
+    h = hashlib.blake2b()
+    for filename in sorted(filenames):
+        h.update(os.path.basename(filename).encode())
+        with open(filename, "r") as f:
+            for line in f:
+                if not line.startswith(_build_hash_ignored_lines):
+                    h.update(line.encode())
+    return h.hexdigest()
+
+def is_build_cached(builder, build_hash):
+    hash_file = os.path.join(builder.gateware_dir, "build_hash.txt")
+    bitstream = os.path.join(builder.gateware_dir, builder.soc.platform.name + ".bit")
+    if not (os.path.exists(hash_file) and os.path.exists(bitstream)):
+        return False
+    with open(hash_file, "r") as f:
+        return f.read().strip() == build_hash
+
+def save_build_hash(builder, build_hash):
+    with open(os.path.join(builder.gateware_dir, "build_hash.txt"), "w") as f:
+        f.write(build_hash + "\n")
+
+def run_vivado(builder):
+    # Regenerate Vivado project/script (to include commands added after builder.build(run=False))
+    # and run it.
+    toolchain = builder.soc.platform.toolchain
+    cwd = os.getcwd()
+    os.chdir(builder.gateware_dir)
+    try:
+        toolchain.build_project()
+        toolchain.run_script(toolchain.build_script())
+    finally:
+        os.chdir(cwd)
+
+# Vivado Jobs --------------------------------------------------------------------------------------
+
+def get_vivado_jobs(jobs=None):
+    # Default to the number of CPUs available to the process (affinity/cgroup cpusets), capped to 8
+    # (max value accepted by most Vivado versions). Explicit values are passed as is.
+    if jobs is None:
+        if hasattr(os, "sched_getaffinity"):
+            cpus = len(os.sched_getaffinity(0))
+        else:
+            cpus = multiprocessing.cpu_count()
+        jobs = min(cpus, 8)
+    return jobs
+
+# Heartbeat ----------------------------------------------------------------------------------------
+
+class _Heartbeat(LiteXModule):
+    def __init__(self):
+        self.o = Signal()
+
+        # # #
+
+        # Maximal-length 26-bit LFSR (x^26 + x^6 + x^2 + x + 1): toggle output once per period
+        # (2^26 - 1 cycles, same blink rate as bit 26 of a binary counter) without carry chain.
+        lfsr = Signal(26, reset=1)
+        self.sync += lfsr.eq(Cat(lfsr[1:], lfsr[0] ^ lfsr[1] ^ lfsr[2] ^ lfsr[6]))
+        self.sync += If(lfsr == 1, self.o.eq(~self.o))
+
+# SATATestSoC --------------------------------------------------------------------------------------
+
+class SATATestSoC(SoCMini):
+    def __init__(self, platform, crg_cls, sys_clk_freq, connector="fmc", gen="gen3",
+        sata_refclk_freq = None,
+        with_analyzer    = False,
+        analyzer_depth   = 128,
+        ident            = "LiteSATA bench"):
+        assert gen in ["gen1", "gen2", "gen3"]
+        # Use 32-bit PHY datapath on gen3 to run sata_tx/rx at 150MHz instead of 300MHz.
+        data_width    = {"gen1": 16, "gen2": 16, "gen3": 32}[gen]
+        sata_clk_freq = {"gen1": 75e6, "gen2": 150e6, "gen3": 300e6}[gen]*16/data_width
+
+        # CRG --------------------------------------------------------------------------------------
+        self.crg = crg_cls(platform, sys_clk_freq)
+
+        # SoCMini ----------------------------------------------------------------------------------
+        SoCMini.__init__(self, platform, sys_clk_freq, ident=ident)
+
+        # UARTBone ---------------------------------------------------------------------------------
+        self.add_uartbone()
+
+        # SATA -------------------------------------------------------------------------------------
+        # RefClk
+        sata_refclk = None
+        if sata_refclk_freq is not None:
+            # Generate RefClk from PLL.
+            # Note: Even when sharing the sys_clk PLL, sata_tx is only frequency-locked (through
+            # the GT's PLL/TXOUTCLK) and sata_rx is recovered from the device, so the PHY's
+            # sys <-> sata_tx/rx crossings must remain asynchronous.
+            self.clock_domains.cd_sata_refclk = ClockDomain()
+            self.crg.pll.create_clkout(self.cd_sata_refclk, sata_refclk_freq, buf=None)
+            sata_refclk = ClockSignal("sata_refclk")
+
+        # PHY
+        # Note: LiteX emits a flat netlist: there is no sata_phy hierarchical cell to apply
+        # KEEP_HIERARCHY/Pblocks on, PHY logic reuse relies on the checkpoint cache instead.
+        self.sata_phy = LiteSATAPHY(platform.device,
+            refclk     = sata_refclk,
+            pads       = platform.request(connector + "2sata"),
+            gen        = gen,
+            clk_freq   = sys_clk_freq,
+            data_width = data_width)
+
+        # Core
+        self.sata_core = LiteSATACore(self.sata_phy)
+
+        # Crossbar
+        # Note: LiteSATABIST requests 3 user ports (generator/checker/identify), so the crossbar's
+        # arbitration is required here and the BIST can't be bound directly to the core.
+        self.sata_crossbar = LiteSATACrossbar(self.sata_core)
+
+        # BIST
+        self.sata_bist = LiteSATABIST(self.sata_crossbar, with_csr=True)
+
+        # Timing constraints
+        platform.add_period_constraint(self.sata_phy.crg.cd_sata_tx.clk, 1e9/sata_clk_freq)
+        platform.add_period_constraint(self.sata_phy.crg.cd_sata_rx.clk, 1e9/sata_clk_freq)
+        # Only sys <-> sata_tx and sys <-> sata_rx exchange data (MultiReg/AsyncFIFO CDCs being
+        # already covered by LiteX's mr_ff constraints), sata_tx <-> sata_rx have no direct paths.
+        platform.add_false_path_constraint(self.crg.cd_sys.clk, self.sata_phy.crg.cd_sata_tx.clk)
+        platform.add_false_path_constraint(self.crg.cd_sys.clk, self.sata_phy.crg.cd_sata_rx.clk)
+
+        # Checkpoint cache key: identical for all builds sharing device/SATA configuration.
+        self.config_hash = sata_config_hash(
+            device           = platform.device,
+            gen              = gen,
+            data_width       = data_width,
+            sata_refclk_freq = sata_refclk_freq,
+        )
+
+        # Leds -------------------------------------------------------------------------------------
+        # Heartbeats are kept directly on sata_tx/rx clocks: they only add 27 FFs to these clocks,
+        # a divided clock (BUFGCE_DIV/BUFR) would cost an additional clock buffer/domain instead.
+        # sys_clk
+        self.sys_heartbeat = _Heartbeat()
+        self.comb += platform.request("user_led", 0).eq(self.sys_heartbeat.o)
+        # tx_clk
+        self.tx_heartbeat = ClockDomainsRenamer("sata_tx")(_Heartbeat())
+        self.comb += platform.request("user_led", 1).eq(self.tx_heartbeat.o)
+        # rx_clk
+        self.rx_heartbeat = ClockDomainsRenamer("sata_rx")(_Heartbeat())
+        self.comb += platform.request("user_led", 2).eq(self.rx_heartbeat.o)
+        # ready (ctrl.ready is already in sys_clk domain, register it to decouple it from the IOB).
+        self.sync.sys += platform.request("user_led", 3).eq(self.sata_phy.ctrl.ready)
+
+        # Analyzer ---------------------------------------------------------------------------------
+        if with_analyzer:
+            analyzer_signals = [
+                self.sata_phy.phy.tx_init.fsm,
+                self.sata_phy.phy.rx_init.fsm,
+                self.sata_phy.ctrl.fsm,
+
+                self.sata_phy.ctrl.ready,
+                self.sata_phy.source,
+                self.sata_phy.sink,
+
+                self.sata_core.command.sink,
+                self.sata_core.command.source,
+
+                self.sata_core.link.rx.fsm,
+                self.sata_core.link.tx.fsm,
+                self.sata_core.transport.rx.fsm,
+                self.sata_core.transport.tx.fsm,
+                self.sata_core.command.rx.fsm,
+                self.sata_core.command.tx.fsm,
+            ]
+            self.analyzer = LiteScopeAnalyzer(analyzer_signals, analyzer_depth,
+                samplerate = sys_clk_freq,
+                register   = True,
+                csr_csv    = "analyzer.csv"
+            )